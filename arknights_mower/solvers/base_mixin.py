@@ -1,9 +1,9 @@
-import lzma
-import pickle
+import re
 from datetime import datetime, timedelta
 
 import cv2
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from arknights_mower import __rootdir__
 from arknights_mower.data import workshop_formula
@@ -14,10 +14,40 @@ from arknights_mower.utils.csleep import MowerExit
 from arknights_mower.utils.image import cropimg, loadres, thres2
 from arknights_mower.utils.log import logger
 
-with lzma.open(f"{__rootdir__}/models/operator_room.model", "rb") as f:
-    OP_ROOM = pickle.loads(f.read())
+# 所有模板展平成一个连续矩阵并按行归一化，匹配时一次矩阵乘法
+with np.load(f"{__rootdir__}/models/operator_room.npz") as f:
+    OP_ROOM_KEYS = f["keys"].tolist()
+    OP_ROOM_MAT = f["templates"]
+OP_ROOM_SHAPE = OP_ROOM_MAT.shape[1:]
+OP_ROOM_MAT = OP_ROOM_MAT.reshape(len(OP_ROOM_KEYS), -1).astype(np.float32)
+OP_ROOM_MAT /= np.linalg.norm(OP_ROOM_MAT, axis=1, keepdims=True)
 
-kernel = np.ones((12, 12), np.uint8)
+kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (12, 12))
+
+# OCR 可能把冒号识别为点，数字与分隔符之间也可能有空格
+TIME_RE = re.compile(r"\s*(\d+)\s*[:.]\s*(\d+)\s*[:.]\s*(\d+)\s*")
+
+# 有色房间标题栏的色相，S/V 不参与判断
+COLORED_ROOMS = ("制造站", "贸易站", "发电站", "训练室", "加工站")
+ROOM_HUE = np.array([25, 99, 36, 178, 32])
+
+# 房间号数字与白色房间标题模板
+DIGIT_TPLS = [loadres(f"room/{i}") for i in range(1, 5)]
+WHITE_ROOM_TPLS = {
+    room: loadres(f"room/{room}")
+    for room in ("central", "dormitory", "meeting", "contact")
+}
+
+
+def _zero_mean(img: np.ndarray) -> np.ndarray:
+    """按通道减去均值并展平，与 TM_CCOEFF 的处理一致"""
+    img = img.astype(np.float32)
+    return (img - img.mean(axis=(0, 1))).ravel()
+
+
+# 房间号数字截图与模板大小相同，TM_CCOEFF_NORMED 退化为一次归一化点积
+DIGIT_MAT = np.stack([_zero_mean(d) for d in DIGIT_TPLS])
+DIGIT_MAT /= np.linalg.norm(DIGIT_MAT, axis=1, keepdims=True)
 
 
 class BaseMixin:
@@ -43,12 +73,16 @@ class BaseMixin:
             name_list = ["工作状态", "效率", "技能", "心情", "信赖值"]
             x_list = (935, 1070, 1210, 1355, 1490)
         y = 70
-        hsv = cv2.cvtColor(self.recog.img, cv2.COLOR_RGB2HSV)
+        # 只取出排序箭头处的 3x5 像素块，拼成一张小图后转换
+        rows = np.r_[y : y + 3, y + 10 : y + 13]
+        cols = np.add.outer(x_list, np.arange(5)).ravel()
+        hsv = cv2.cvtColor(self.recog.img[np.ix_(rows, cols)], cv2.COLOR_RGB2HSV)
         mask = cv2.inRange(hsv, (95, 100, 100), (105, 255, 255))
-        for idx, x in enumerate(x_list):
-            if np.count_nonzero(mask[y : y + 3, x : x + 5]):
+        mask = mask.reshape(2, 3, len(x_list), 5).any(axis=(1, 3))
+        for idx, (up, down) in enumerate(mask.T):
+            if up:
                 return (name_list[idx], False)
-            if np.count_nonzero(mask[y + 10 : y + 13, x : x + 5]):
+            if down:
                 return (name_list[idx], True)
 
     def switch_arrange_order(self, name, current_room, ascending=False):
@@ -84,39 +118,42 @@ class BaseMixin:
         full_scan=True,
         train=False,
     ):
-        try:
-            # 识别干员
-            self.recog.update()
-            while self.find("connecting"):
-                logger.info("等待网络连接")
-                self.sleep()
-            # 返回的顺序是从左往右从上往下
-            ret = (
-                operator_list(self.recog.img, full_scan=full_scan)
-                if not train
-                else operator_list_train(self.recog.img)
-            )
-            # 提取识别出来的干员的名字
-            select_name = []
-            for name, scope in ret:
-                if name in agent:
-                    select_name.append(name)
-                    self.tap(scope, interval=0)
-                    agent.remove(name)
-                    # 如果是按照个数选择 Free
-                    if max_agent_count != -1:
-                        if len(select_name) >= max_agent_count:
-                            return select_name, ret
-            return select_name, ret
-        except MowerExit:
-            raise
-        except Exception as e:
-            error_count += 1
-            if error_count < 3:
-                return self.scan_agent(agent, error_count, max_agent_count, False)
-            else:
-                logger.exception(e)
-                raise e
+        while True:
+            try:
+                # 识别干员
+                self.recog.update()
+                while self.find("connecting"):
+                    logger.info("等待网络连接")
+                    self.sleep()
+                # 返回的顺序是从左往右从上往下
+                ret = (
+                    operator_list(self.recog.img, full_scan=full_scan)
+                    if not train
+                    else operator_list_train(self.recog.img)
+                )
+                # 提取识别出来的干员的名字
+                select_name = []
+                agent_set = set(agent)
+                for name, scope in ret:
+                    if name in agent_set:
+                        select_name.append(name)
+                        self.tap(scope, interval=0)
+                        agent_set.discard(name)
+                        # 调用方依赖 agent 列表被原地修改
+                        agent.remove(name)
+                        # 如果是按照个数选择 Free
+                        if max_agent_count != -1:
+                            if len(select_name) >= max_agent_count:
+                                return select_name, ret
+                return select_name, ret
+            except MowerExit:
+                raise
+            except Exception as e:
+                error_count += 1
+                if error_count >= 3:
+                    logger.exception(e)
+                    raise e
+                full_scan = False
 
     def verify_agent(
         self,
@@ -127,36 +164,36 @@ class BaseMixin:
         full_scan=True,
         train=False,
     ):
-        try:
-            # 识别干员
-            while self.find("connecting"):
-                logger.info("等待网络连接")
-                self.sleep()
-            ret = (
-                operator_list(self.recog.img, full_scan=full_scan)
-                if not train
-                else operator_list_train(self.recog.img)
-            )  # 返回的顺序是从左往右从上往下
-            # 提取识别出来的干员的名字
-            index = 0
-            for name, scope in ret:
-                if index >= len(agent):
-                    return True
-                if name != agent[index]:
-                    return False
-                index += 1
-            return True
-        except Exception as e:
-            error_count += 1
-            if room != "train":
-                self.switch_arrange_order("技能", room)
-            if error_count < 3:
-                return self.verify_agent(
-                    agent, room, error_count, max_agent_count, full_scan=False
-                )
-            else:
-                logger.exception(e)
-                raise e
+        while True:
+            try:
+                # 识别干员
+                while self.find("connecting"):
+                    logger.info("等待网络连接")
+                    self.sleep()
+                ret = (
+                    operator_list(self.recog.img, full_scan=full_scan)
+                    if not train
+                    else operator_list_train(self.recog.img)
+                )  # 返回的顺序是从左往右从上往下
+                # 提取识别出来的干员的名字
+                index = 0
+                for name, scope in ret:
+                    if index >= len(agent):
+                        return True
+                    if name != agent[index]:
+                        return False
+                    index += 1
+                return True
+            except MowerExit:
+                raise
+            except Exception as e:
+                error_count += 1
+                if room != "train":
+                    self.switch_arrange_order("技能", room)
+                if error_count >= 3:
+                    logger.exception(e)
+                    raise e
+                full_scan = False
 
     def swipe_left(self, right_swipe, special_filter):
         if right_swipe > 3:
@@ -176,6 +213,15 @@ class BaseMixin:
                 self.swipe_noinertia((650, 540), (2500, 0))
         return 0
 
+    def profession_filter_btn_x(self):
+        """职业筛选确认按钮的横坐标
+
+        按 profession_filter 中的表格，找到 confirm_blue 时其位置已足以判断
+        筛选是否打开，只有找不到时才需要再匹配 confirm_train
+        """
+        confirm_btn = self.find("confirm_blue") or self.find("confirm_train")
+        return confirm_btn[0][0] if confirm_btn else None
+
     def profession_filter(self, profession=None):
         """
                     confirm_blue	confirm_train
@@ -192,12 +238,8 @@ class BaseMixin:
             logger.info("关闭职业筛选")
             self.profession_filter("ALL")
             while (
-                (confirm_btn := self.find("confirm_blue")) is not None
-                and confirm_btn[0][0] < open_threshold
-            ) or (
-                (confirm_btn := self.find("confirm_train")) is not None
-                and confirm_btn[0][0] < open_threshold
-            ):
+                btn_x := self.profession_filter_btn_x()
+            ) is not None and btn_x < open_threshold:
                 self.tap((1860, 60), 0.1)
                 retry += 1
                 if retry > 5:
@@ -207,12 +249,8 @@ class BaseMixin:
         label_pos = [(x, 135 + i * 110) for i in range(9)]
         label_pos_map = dict(zip(self.profession_labels, label_pos))
         while (
-            (confirm_btn := self.find("confirm_blue")) is not None
-            and confirm_btn[0][0] > open_threshold
-        ) or (
-            (confirm_btn := self.find("confirm_train")) is not None
-            and confirm_btn[0][0] > open_threshold
-        ):
+            btn_x := self.profession_filter_btn_x()
+        ) is not None and btn_x > open_threshold:
             self.tap((1860, 60), 0.1)
             retry += 1
             if retry > 5:
@@ -220,38 +258,28 @@ class BaseMixin:
         retry = 0
         # 点击一次ALL先
         self.tap(label_pos_map["ALL"], 0.1)
-        while self.get_color(label_pos_map[profession])[2] < 240:
-            logger.debug(f"配色为： {self.get_color(label_pos_map[profession])[2]}")
+        y = label_pos_map[profession][1]
+        # 每轮只读一次标签像素的蓝色通道
+        while (blue := self.recog.img[y, x, 2]) < 240:
+            logger.debug(f"配色为： {blue}")
             self.tap(label_pos_map[profession], 0.1)
             retry += 1
             if retry > 5:
                 raise Exception("打开职业筛选失败")
 
     def detect_room_number(self, img) -> int:
-        score = []
-        for i in range(1, 5):
-            digit = loadres(f"room/{i}")
-            result = cv2.matchTemplate(img, digit, cv2.TM_CCOEFF_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            score.append(max_val)
-        return score.index(max(score)) + 1
+        vec = _zero_mean(img)
+        return int(np.argmax(DIGIT_MAT @ vec)) + 1
 
     def detect_room(self) -> str:
-        color_map = {
-            "制造站": 25,
-            "贸易站": 99,
-            "发电站": 36,
-            "训练室": 178,
-            "加工站": 32,
-        }
         img = cropimg(self.recog.img, ((568, 18), (957, 95)))
-        hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
-        colored_room = None
-        for room, color in color_map.items():
-            mask = cv2.inRange(hsv, (color - 1, 0, 0), (color + 2, 255, 255))
-            if cv2.countNonZero(mask) > 1000:
-                colored_room = room
-                break
+        hue = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)[:, :, 0]
+        # 色相直方图的前缀和，[hue - 1, hue + 2] 内的像素数只需一次相减
+        csum = np.cumsum(np.bincount(hue.ravel(), minlength=181))
+        counts = csum[ROOM_HUE + 2] - csum[ROOM_HUE - 2]
+        colored_room = next(
+            (room for room, cnt in zip(COLORED_ROOMS, counts) if cnt > 1000), None
+        )
         if colored_room in ["制造站", "贸易站", "发电站"]:
             digit_1 = cropimg(img, ((211, 24), (232, 54)))
             digit_2 = cropimg(img, ((253, 24), (274, 54)))
@@ -265,14 +293,12 @@ class BaseMixin:
         elif colored_room == "加工站":
             logger.debug("加工站B105")
             return "factory"
-        white_room = ["central", "dormitory", "meeting", "contact"]
         score = []
-        for room in white_room:
-            tpl = loadres(f"room/{room}")
+        for tpl in WHITE_ROOM_TPLS.values():
             result = cv2.matchTemplate(img, tpl, cv2.TM_CCOEFF_NORMED)
             min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
             score.append(max_val)
-        room = white_room[score.index(max(score))]
+        room = list(WHITE_ROOM_TPLS)[score.index(max(score))]
         if room == "central":
             logger.debug("控制中枢")
         elif room == "dormitory":
@@ -360,8 +386,7 @@ class BaseMixin:
 
     def read_accurate_mood(self, img):
         try:
-            img = thres2(img, 200)
-            return cv2.countNonZero(img) * 24 / 310
+            return np.count_nonzero(img > 200) * 24 / 310
         except Exception as e:
             logger.exception(e)
             return 24
@@ -380,21 +405,21 @@ class BaseMixin:
         img = cv2.copyMakeBorder(img, 10, 10, 10, 10, cv2.BORDER_CONSTANT, None, (0,))
         dilation = cv2.dilate(img, kernel, iterations=1)
         contours, _ = cv2.findContours(dilation, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        rect = map(lambda c: cv2.boundingRect(c), contours)
-        x, y, w, h = sorted(rect, key=lambda c: c[0])[0]
+        x, y, w, h = min((cv2.boundingRect(c) for c in contours), key=lambda c: c[0])
         img = img[y : y + h, x : x + w]
-        tpl = np.zeros((46, 265), dtype=np.uint8)
-        tpl[: img.shape[0], : img.shape[1]] = img
-        tpl = cv2.copyMakeBorder(tpl, 2, 2, 2, 2, cv2.BORDER_CONSTANT, None, (0,))
-        max_score = 0
-        best_operator = None
-        for operator, template in OP_ROOM.items():
-            result = cv2.matchTemplate(tpl, template, cv2.TM_CCORR_NORMED)
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-            if max_val > max_score:
-                max_score = max_val
-                best_operator = operator
-        return best_operator
+        # 直接写入四周各留 2 像素空白的 float32 图像，省去补边与类型转换的拷贝
+        th, tw = OP_ROOM_SHAPE
+        tpl = np.zeros((th + 4, tw + 4), dtype=np.float32)
+        tpl[2 : 2 + img.shape[0], 2 : 2 + img.shape[1]] = img
+        # 模板在补边后的图像上共 5x5 个位置，结果等价于 TM_CCORR_NORMED
+        windows = sliding_window_view(tpl, OP_ROOM_SHAPE).reshape(25, -1)
+        norm = np.linalg.norm(windows, axis=1)
+        scores = OP_ROOM_MAT @ windows.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(norm > 0, scores / norm, 0).max(axis=1)
+        if scores.max() <= 0:
+            return None
+        return OP_ROOM_KEYS[int(scores.argmax())]
 
     def read_screen(self, img, type="mood", limit=24, cord=None):
         if cord is not None:
@@ -418,8 +443,6 @@ class BaseMixin:
                 else:
                     return -1
             elif "time" in type:
-                if "." in ret:
-                    ret = ret.replace(".", ":")
                 return ret.strip()
             else:
                 return ret
@@ -550,28 +573,33 @@ class BaseMixin:
             logger.exception(e)
 
     def read_time(self, cord, upperlimit, error_count=0, use_digit_reader=False):
-        # 刷新图片
-        self.recog.update()
-        try:
-            if use_digit_reader:
-                time_str = self.digit_reader.get_time(self.recog.gray)
-            else:
-                time_str = self.read_screen(self.recog.img, type="time", cord=cord)
-            logger.debug(time_str)
-            h, m, s = str(time_str).split(":")
-            if int(m) > 60 or int(s) > 60:
-                raise Exception("读取错误")
-            res = int(h) * 3600 + int(m) * 60 + int(s)
-            if upperlimit is not None and res > upperlimit:
-                raise Exception("超过读取上限")
-            else:
+        while True:
+            # 刷新图片
+            self.recog.update()
+            try:
+                if use_digit_reader:
+                    time_str = self.digit_reader.get_time(self.recog.gray)
+                else:
+                    time_str = self.read_screen(self.recog.img, type="time", cord=cord)
+                logger.debug(time_str)
+                if not isinstance(time_str, str) or not time_str:
+                    raise Exception("识别失败")
+                match = TIME_RE.fullmatch(time_str)
+                if match is None:
+                    raise Exception("格式错误")
+                h, m, s = int(match[1]), int(match[2]), int(match[3])
+                if m > 60 or s > 60:
+                    raise Exception("读取错误")
+                res = h * 3600 + m * 60 + s
+                if upperlimit is not None and res > upperlimit:
+                    raise Exception("超过读取上限")
                 return res
-        except Exception:
-            if error_count > 3:
-                logger.debug(f"读取失败{error_count}次超过上限")
-                return None
-            else:
-                logger.debug("读取失败")
-                return self.read_time(
-                    cord, upperlimit, error_count + 1, use_digit_reader
-                )
+            except MowerExit:
+                raise
+            except Exception as e:
+                if error_count > 3:
+                    logger.debug(f"读取失败{error_count}次超过上限")
+                    return None
+                # 同一张截图的识别结果是确定的，重试必须重新截图
+                logger.debug(f"读取失败：{e}")
+                error_count += 1
@@ -0,0 +1,136 @@
+import smtplib
+import subprocess
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from arknights_mower.utils import config, email
+
+CONF = {
+    "mail_enable": True,
+    "notification_level": "INFO",
+    "mail_subject": "[Mower] ",
+    "account": "mower@example.com",
+    "pass_code": "pass",
+    "recipient": ["user@example.com"],
+}
+
+# 子进程发出两封邮件后立即退出，每封发送耗时 0.3 秒
+EXIT_SCRIPT = f"""
+import smtplib
+import time
+from unittest.mock import MagicMock
+
+from arknights_mower.utils import config, email
+
+def send(*args):
+    time.sleep(0.3)
+    print("sent", flush=True)
+
+smtp = MagicMock()
+smtp.noop.return_value = (250, b"OK")
+smtp.send_message.side_effect = send
+smtplib.SMTP_SSL = MagicMock(return_value=smtp)
+for k, v in {CONF!r}.items():
+    setattr(config.conf, k, v)
+config.conf.custom_smtp_server.enable = False
+email.send_message("第一封")
+email.send_message("第二封")
+"""
+
+
+def make_smtp(fail_send=False):
+    smtp = MagicMock()
+    smtp.noop.return_value = (250, b"OK")
+    if fail_send:
+        smtp.send_message.side_effect = smtplib.SMTPServerDisconnected("gone")
+    return smtp
+
+
+class TestSendMessage(unittest.TestCase):
+    def setUp(self):
+        conf = config.conf
+        patchers = [patch.object(conf, k, v) for k, v in CONF.items()]
+        patchers += [
+            patch.object(conf.custom_smtp_server, "enable", False),
+            patch.object(email, "SMTP_IDLE_TIMEOUT", 0.2),
+            patch.object(email, "sleep", lambda _: None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def wait_worker(self):
+        worker = email._mail_worker
+        if worker is not None:
+            worker.join(5)
+        self.assertIsNone(email._mail_worker)
+
+    def test_reuse_and_idle_close(self):
+        smtp = make_smtp()
+        with patch("smtplib.SMTP_SSL", return_value=smtp) as smtp_ssl:
+            email.send_message("第一封")
+            email.send_message("第二封")
+            self.wait_worker()
+        smtp_ssl.assert_called_once()
+        self.assertEqual(smtp.send_message.call_count, 2)
+        smtp.quit.assert_called_once()
+
+    def test_stale_connection_reconnects(self):
+        stale, fresh = make_smtp(), make_smtp()
+        stale.noop.side_effect = smtplib.SMTPServerDisconnected("idle")
+        with patch("smtplib.SMTP_SSL", side_effect=[stale, fresh]):
+            email.send_message("第一封")
+            email.send_message("第二封")
+            self.wait_worker()
+        # 失效的连接上只发出过一封，没有重发
+        self.assertEqual(stale.send_message.call_count, 1)
+        self.assertEqual(fresh.send_message.call_count, 1)
+
+    def test_failed_send_does_not_block_queue(self):
+        broken, next_conn = make_smtp(True), make_smtp()
+        retried = MagicMock()
+        with (
+            patch("smtplib.SMTP_SSL", side_effect=[broken, next_conn]),
+            patch.object(email, "_retry_send", retried),
+        ):
+            email.send_message("失败")
+            email.send_message("正常")
+            self.assertTrue(email.flush_mail(5))
+        self.assertEqual(next_conn.send_message.call_count, 1)
+        retried.assert_called_once()
+
+    def test_flush_mail(self):
+        smtp = make_smtp()
+        with (
+            patch("smtplib.SMTP_SSL", return_value=smtp),
+            patch.object(email, "SMTP_IDLE_TIMEOUT", 60),
+        ):
+            email.send_message("第一封")
+            email.send_message("第二封")
+            self.assertTrue(email.flush_mail(5))
+        self.assertIsNone(email._mail_worker)
+        self.assertEqual(smtp.send_message.call_count, 2)
+        smtp.quit.assert_called_once()
+
+    def test_flush_at_exit(self):
+        result = subprocess.run(
+            [sys.executable, "-c", EXIT_SCRIPT],
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split().count("sent"), 2)
+
+    def test_retry_send(self):
+        smtp = make_smtp()
+        mail = email.Email("重试", "重试", None)
+        with patch("smtplib.SMTP_SSL", side_effect=[OSError("down"), smtp]):
+            email._retry_send(mail)
+        smtp.send_message.assert_called_once()
+        smtp.quit.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
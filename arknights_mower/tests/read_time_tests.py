@@ -0,0 +1,28 @@
+import unittest
+from unittest.mock import MagicMock
+
+from arknights_mower.solvers.base_mixin import BaseMixin
+
+
+class TestReadTime(unittest.TestCase):
+    def read_time(self, time_str):
+        solver = BaseMixin()
+        solver.recog = MagicMock()
+        solver.read_screen = MagicMock(return_value=time_str)
+        return solver.read_time((0, 0, 0, 0), None)
+
+    def test_colon(self):
+        self.assertEqual(self.read_time("12:34:56"), 12 * 3600 + 34 * 60 + 56)
+
+    def test_dot(self):
+        self.assertEqual(self.read_time("12.34.56"), 12 * 3600 + 34 * 60 + 56)
+
+    def test_spaced(self):
+        self.assertEqual(self.read_time("12 : 34 . 56"), 12 * 3600 + 34 * 60 + 56)
+
+    def test_invalid(self):
+        self.assertIsNone(self.read_time("12:34"))
+
+
+if __name__ == "__main__":
+    unittest.main()
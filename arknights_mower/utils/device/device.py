@@ -75,20 +75,7 @@ class Device:
             self, points: list[tuple[int, int]], durations: list[int], up_wait: int
         ) -> None:
             if self.mumu12IPC:
-                total = len(durations)
-                for idx, (S, E, D) in enumerate(
-                    zip(points[:-1], points[1:], durations)
-                ):
-                    self.mumu12IPC.swipe(
-                        S[0],
-                        S[1],
-                        E[0],
-                        E[1],
-                        D / 1000,
-                        fall=idx == 0,
-                        lift=idx == total - 1,
-                        interval=up_wait / 1000 if idx == total - 1 else 0,
-                    )
+                self.mumu12IPC.swipe_ext(points, durations, interval=up_wait / 1000)
             elif self.maatouch:
                 self.maatouch.swipe(
                     points,
@@ -264,7 +251,6 @@ class Device:
             while True:
                 try:
                     img = self.control.mumu12IPC.capture_display()
-                    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
                     break
                 except Exception as e:
                     logger.exception(e)
@@ -281,7 +267,6 @@ class Device:
                     img = bytes2img(r.content)
                     if config.conf.droidcast.rotate:
                         img = cv2.rotate(img, cv2.ROTATE_180)
-                    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
                     break
                 except Exception as e:
                     logger.exception(e)
@@ -311,7 +296,6 @@ class Device:
                     if config.conf.touch_method == "scrcpy":
                         self.control.scrcpy = Scrcpy(self.client)
             img = bytes2img(data)
-            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
         else:
             command = "screencap 2>/dev/null | gzip -1"
             while True:
@@ -330,7 +314,6 @@ class Device:
                 1080, 1920, 4
             )
             img = cv2.cvtColor(array, cv2.COLOR_RGBA2RGB)
-            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
 
         screencap = img2bytes(img)
         save_screenshot(screencap)
@@ -350,7 +333,7 @@ class Device:
         else:
             config.screenshot_count += 1
 
-        return screencap, img, gray
+        return screencap, img
 
     def current_focus(self) -> str:
         """detect current focus app"""
@@ -9,8 +9,9 @@ import os
 import re
 import subprocess
 import time
-from typing import Any, Callable, Optional
+from typing import Optional
 
+import cv2
 import numpy as np
 
 from arknights_mower.utils import config
@@ -18,6 +19,17 @@ from arknights_mower.utils.csleep import MowerExit
 from arknights_mower.utils.log import logger
 from arknights_mower.utils.simulator import restart_simulator
 
+# MuMuManager.exe api player_state 的输出格式
+_PLAYER_INDEX_RE = re.compile(r"player index: (\d+)(?:\r\n|\r|\n)")
+_PLAYER_STATE_RE = re.compile(r"state: state=([^\s\r\n]+)(?:\r\n|\r|\n|$)")
+
+# external_renderer_ipc.dll 相对模拟器根目录的可能位置
+_RENDERER_SUBPATHS = (
+    ("shell", "sdk", "external_renderer_ipc.dll"),
+    ("nx_main", "sdk", "external_renderer_ipc.dll"),
+    ("sdk", "external_renderer_ipc.dll"),
+)
+
 
 def retry_wrapper(max_retries: int = 3, delay: float = 0.5):
     """
@@ -93,6 +105,9 @@ class MuMu12IPC:
     _H = 1080
     _BYTES = _W * _H * 4
 
+    # MuMuManager.exe path -> coord system flag, shared across reconnects
+    _coord_cache: dict[str, bool] = {}
+
     def __init__(self, device):
         self.device = device
         # Normalize emulator folder from config (compatible with your project layout)
@@ -103,7 +118,11 @@ class MuMu12IPC:
             else norm
         )
 
+        self._c_emu_root = ctypes.c_wchar_p(self._emu_root)
+
         self._index: int = int(config.conf.simulator.index)
+        # 与模拟器路径、序号一样在创建时读取一次
+        self._pkg: bytes = config.conf.APPNAME.encode("utf-8")
         self._conn: int = 0
         self._display_id: int = -1
         self._app_index: int = (
@@ -119,7 +138,11 @@ class MuMu12IPC:
         # Lazy-initialized members
         self._dll = None
         self._buffer = None  # single reusable framebuffer
-        self._is_new_coord: Optional[bool] = None  # coord system flag (>= 4.1.21)
+        self._np_view = None  # cached (H, W, 4) ndarray over _buffer
+        # coord system flag (>= 4.1.21)
+        self._is_new_coord: Optional[bool] = self._coord_cache.get(self._manager)
+        if self._is_new_coord is not None:
+            self._bind_map_xy()
 
         # Preload to fail-fast with clear diagnostics
         self._load_renderer()
@@ -131,13 +154,12 @@ class MuMu12IPC:
         """
         Load external_renderer_ipc.dll from typical MuMu 12 locations.
         """
-        candidates = [
-            os.path.join(self._emu_root, "shell", "sdk", "external_renderer_ipc.dll"),
-            os.path.join(self._emu_root, "nx_main", "sdk", "external_renderer_ipc.dll"),
-            os.path.join(self._emu_root, "sdk", "external_renderer_ipc.dll"),
-        ]
+        candidates = [os.path.join(self._emu_root, *sub) for sub in _RENDERER_SUBPATHS]
         last_err = None
         for path in candidates:
+            # 不存在的路径直接跳过，不必等 CDLL 抛异常
+            if not os.path.isfile(path):
+                continue
             try:
                 self._dll = ctypes.CDLL(path)
                 logger.debug(f"Loaded MuMu renderer DLL: {path}")
@@ -215,6 +237,17 @@ class MuMu12IPC:
         ]
         self._dll.nemu_input_event_key_up.restype = ctypes.c_int
 
+        # 缓存函数指针，避免每次调用都经过 CDLL 的属性查找
+        self._f_connect = self._dll.nemu_connect
+        self._f_get_display_id = self._dll.nemu_get_display_id
+        self._f_capture = self._dll.nemu_capture_display
+        self._f_touch_down = self._dll.nemu_input_event_touch_down
+        self._f_touch_up = self._dll.nemu_input_event_touch_up
+        self._f_finger_down = self._dll.nemu_input_event_finger_touch_down
+        self._f_finger_up = self._dll.nemu_input_event_finger_touch_up
+        self._f_key_down = self._dll.nemu_input_event_key_down
+        self._f_key_up = self._dll.nemu_input_event_key_up
+
     def _manager_json(self, subcmd: str) -> dict:
         """
         Call MuMuManager.exe to get JSON for 'setting' or 'info' and decode.
@@ -241,9 +274,7 @@ class MuMu12IPC:
             ]
             try:
                 result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                output = result.stdout.strip()
-                return output
-                # logger.debug("MuMu setting info loaded and cached.")
+                self._setting_info = result.stdout.strip()
             except Exception as e:
                 logger.error(f"获取 MuMu setting 失败: {e}")
                 raise
@@ -259,6 +290,8 @@ class MuMu12IPC:
         if self._is_new_coord is None:
             # MuMu 12 changed coordinate arguments since 4.1.21
             self._is_new_coord = parts >= (4, 1, 21)
+            self._coord_cache[self._manager] = self._is_new_coord
+            self._bind_map_xy()
         return parts
 
     def get_emulator_info(self):
@@ -269,15 +302,13 @@ class MuMu12IPC:
             player_index = None
             found_condition = False
             stdout = result.stdout
-            pattern1 = r"player index: (\d+)(?:\r\n|\r|\n)"
-            match1 = re.search(pattern1, stdout)
+            match1 = _PLAYER_INDEX_RE.search(stdout)
             if match1:
                 player_index = int(match1.group(1))
                 found_condition = True
             if found_condition:
                 if player_index == self._index:
-                    pattern2 = r"state: state=([^\s\r\n]+)(?:\r\n|\r|\n|$)"
-                    match2 = re.search(pattern2, stdout)
+                    match2 = _PLAYER_STATE_RE.search(stdout)
                     if match2:
                         return match2.group(1)
             raise
@@ -313,12 +344,12 @@ class MuMu12IPC:
     def connect(self):
         """
         Establish IPC connection to emulator if running.
+        Only asks MuMuManager.exe for the emulator state when connecting fails.
         """
-        if self._emu_state() != "running":
-            raise Exception("模拟器未启动，请启动模拟器")
-        path = ctypes.c_wchar_p(self._emu_root)
-        self._conn = self._dll.nemu_connect(path, self._index)
+        self._conn = self._f_connect(self._c_emu_root, self._index)
         if self._conn == 0:
+            if self._emu_state() != "running":
+                raise Exception("模拟器未启动，请启动模拟器")
             raise Exception("连接模拟器失败，请启动模拟器")
         logger.info("MuMu IPC connected.")
 
@@ -326,19 +357,23 @@ class MuMu12IPC:
         """
         Bind to target app display using package name from config.
         """
-        pkg = config.conf.APPNAME.encode("utf-8")
-        self._display_id = self._dll.nemu_get_display_id(
-            self._conn, pkg, self._app_index
+        self._display_id = self._f_get_display_id(
+            self._conn, self._pkg, self._app_index
         )
         if self._display_id < 0:
             raise RuntimeError("获取Display ID失败")
         logger.debug(f"Display bound: id={self._display_id}")
 
-    @retry_wrapper(3)  # type: ignore
     def _ensure_ready(self):
         """
         Ensure connection and display id are valid; auto-recover if needed.
         """
+        if self._conn and self._display_id >= 0:
+            return
+        self._reconnect()
+
+    @retry_wrapper(3)  # type: ignore
+    def _reconnect(self):
         if self._conn == 0:
             self.connect()
         if self._display_id < 0:
@@ -347,33 +382,42 @@ class MuMu12IPC:
     def _ensure_buffer(self):
         if self._buffer is None:
             self._buffer = (ctypes.c_ubyte * self._BYTES)()
+            self._np_view = np.frombuffer(self._buffer, dtype=np.uint8).reshape(
+                (self._H, self._W, 4)
+            )
+            self._w = ctypes.c_int(self._W)
+            self._h = ctypes.c_int(self._H)
+            self._w_ref = ctypes.byref(self._w)
+            self._h_ref = ctypes.byref(self._h)
 
-    def capture_display(self) -> np.ndarray:
+    def capture_display(self, out: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Capture RGBA frame into reusable buffer, return HxWx3 (RGB) numpy array flipped to upright.
+
+        The frame is written into `out` (contiguous HxWx3 uint8) when given, which is
+        overwritten again by the next call that passes it; otherwise a new array is
+        returned, so callers may keep earlier frames (e.g. depotREC comparing scans).
         """
         try:
             self._ensure_ready()
             self._ensure_buffer()
 
-            w = ctypes.c_int(self._W)
-            h = ctypes.c_int(self._H)
-            ret = self._dll.nemu_capture_display(
+            ret = self._f_capture(
                 self._conn,
                 self._display_id,
                 self._BYTES,
-                ctypes.byref(w),
-                ctypes.byref(h),
+                self._w_ref,
+                self._h_ref,
                 self._buffer,
             )
             if ret != 0:
                 raise MuMuIpcError(f"capture failed: {ret}")
 
-            # Interpret buffer: RGBA -> RGB, flip vertically
-            frame = np.frombuffer(self._buffer, dtype=np.uint8).reshape(
-                (self._H, self._W, 4)
-            )[:, :, :3]
-            return np.flipud(frame)
+            # RGBA -> RGB, then flip vertically in place; the result is
+            # contiguous so later OpenCV calls need no extra copy
+            frame = cv2.cvtColor(self._np_view, cv2.COLOR_RGBA2RGB, dst=out)
+            cv2.flip(frame, 0, dst=frame)
+            return frame
         except Exception as e:
             logger.error(f"capture_display error: {e}")
             # Attempt soft recovery for next call
@@ -382,22 +426,35 @@ class MuMu12IPC:
             self.device.exit()
             return np.zeros((self._H, self._W, 3), dtype=np.uint8)
 
-    def _map_xy(self, x: int, y: int) -> tuple[int, int]:
+    def _map_xy_detect(self, x: int, y: int) -> tuple[int, int]:
         """
         Map logical coordinates to MuMu IPC expected arguments depending on version.
+        Detects the version on first use, then binds a concrete mapper via _bind_map_xy.
         """
         if self._is_new_coord is None:
             self._emu_version()
-        if self._is_new_coord:
-            return int(x), int(y)
+        self._bind_map_xy()
+        return self._map_xy(x, y)
+
+    # 坐标系确定前使用 _map_xy_detect，之后被实例上的具体映射覆盖
+    _map_xy = _map_xy_detect
+
+    def _map_xy_new(self, x: int, y: int) -> tuple[int, int]:
+        return int(x), int(y)
+
+    def _map_xy_old(self, x: int, y: int) -> tuple[int, int]:
         return int(self._H - y), int(x)
 
+    def _bind_map_xy(self):
+        """
+        坐标系确定后换成对应的映射函数，省去每次调用时的判断
+        """
+        self._map_xy = self._map_xy_new if self._is_new_coord else self._map_xy_old
+
     def key_down(self, key_code: int):
         try:
             self._ensure_ready()
-            rc = self._dll.nemu_input_event_key_down(
-                self._conn, self._display_id, int(key_code)
-            )
+            rc = self._f_key_down(self._conn, self._display_id, int(key_code))
             if rc != 0:
                 raise MuMuIpcError(f"key_down failed: {rc}")
         except Exception as e:
@@ -409,9 +466,7 @@ class MuMu12IPC:
     def key_up(self, key_code: int):
         try:
             self._ensure_ready()
-            rc = self._dll.nemu_input_event_key_up(
-                self._conn, self._display_id, int(key_code)
-            )
+            rc = self._f_key_up(self._conn, self._display_id, int(key_code))
             if rc != 0:
                 raise MuMuIpcError(f"key_up failed: {rc}")
         except Exception as e:
@@ -424,9 +479,7 @@ class MuMu12IPC:
         try:
             self._ensure_ready()
             tx, ty = self._map_xy(x, y)
-            rc = self._dll.nemu_input_event_touch_down(
-                self._conn, self._display_id, tx, ty
-            )
+            rc = self._f_touch_down(self._conn, self._display_id, tx, ty)
             if rc != 0:
                 raise MuMuIpcError(f"touch_down failed: {rc}")
         except Exception as e:
@@ -438,7 +491,7 @@ class MuMu12IPC:
     def touch_up(self):
         try:
             self._ensure_ready()
-            rc = self._dll.nemu_input_event_touch_up(self._conn, self._display_id)
+            rc = self._f_touch_up(self._conn, self._display_id)
             if rc != 0:
                 raise MuMuIpcError(f"touch_up failed: {rc}")
         except Exception as e:
@@ -451,7 +504,7 @@ class MuMu12IPC:
         try:
             self._ensure_ready()
             tx, ty = self._map_xy(x, y)
-            rc = self._dll.nemu_input_event_finger_touch_down(
+            rc = self._f_finger_down(
                 self._conn, self._display_id, int(finger_id), tx, ty
             )
             if rc != 0:
@@ -465,9 +518,7 @@ class MuMu12IPC:
     def finger_touch_up(self, finger_id: int):
         try:
             self._ensure_ready()
-            rc = self._dll.nemu_input_event_finger_touch_up(
-                self._conn, self._display_id, int(finger_id)
-            )
+            rc = self._f_finger_up(self._conn, self._display_id, int(finger_id))
             if rc != 0:
                 raise MuMuIpcError(f"finger_touch_up failed: {rc}")
         except Exception as e:
@@ -477,18 +528,75 @@ class MuMu12IPC:
             self.device.exit()
 
     def tap(self, x: int, y: int, hold_time: float = 0.07):
-        self.touch_down(x, y)
-        time.sleep(hold_time)
-        self.touch_up()
+        # 按下与抬起共用一次连接检查
+        try:
+            self._ensure_ready()
+            tx, ty = self._map_xy(x, y)
+            rc = self._f_touch_down(self._conn, self._display_id, tx, ty)
+            if rc != 0:
+                raise MuMuIpcError(f"touch_down failed: {rc}")
+            if hold_time > 0:
+                time.sleep(hold_time)
+            rc = self._f_touch_up(self._conn, self._display_id)
+            if rc != 0:
+                raise MuMuIpcError(f"touch_up failed: {rc}")
+        except Exception as e:
+            logger.error(f"tap error: {e}")
+            self._conn = 0
+            self._display_id = -1
+            self.device.exit()
 
     def send_keyevent(self, key_code: int, hold_time: float = 0.1):
-        self.key_down(key_code)
-        time.sleep(hold_time)
-        self.key_up(key_code)
+        try:
+            self._ensure_ready()
+            rc = self._f_key_down(self._conn, self._display_id, int(key_code))
+            if rc != 0:
+                raise MuMuIpcError(f"key_down failed: {rc}")
+            if hold_time > 0:
+                time.sleep(hold_time)
+            rc = self._f_key_up(self._conn, self._display_id, int(key_code))
+            if rc != 0:
+                raise MuMuIpcError(f"key_up failed: {rc}")
+        except Exception as e:
+            logger.error(f"send_keyevent error: {e}")
+            self._conn = 0
+            self._display_id = -1
+            self.device.exit()
 
     def back(self):
         self.send_keyevent(1)
 
+    def _move(self, segments: list[tuple[int, int, int, int, float]], steps: int):
+        """
+        按顺序沿各段直线移动已按下的触点，每段 steps 步，段的时长单位为秒
+        """
+        # 连接只检查一次；按截止时间补偿每步的调用耗时，使总时长接近各段时长之和
+        try:
+            self._ensure_ready()
+            touch_down = self._f_touch_down
+            conn, display_id = self._conn, self._display_id
+            deadline = time.monotonic()
+            for x0, y0, x1, y1, duration in segments:
+                dx, dy = x1 - x0, y1 - y0
+                seg_start = deadline
+                for i in range(1, steps + 1):
+                    t = i / steps
+                    tx, ty = self._map_xy(int(x0 + dx * t), int(y0 + dy * t))
+                    rc = touch_down(conn, display_id, tx, ty)
+                    if rc != 0:
+                        raise MuMuIpcError(f"touch_down failed: {rc}")
+                    deadline = seg_start + duration * t
+                    remaining = deadline - time.monotonic()
+                    if remaining > 0:
+                        time.sleep(remaining)
+            return True
+        except Exception as e:
+            logger.error(f"swipe error: {e}")
+            self._conn = 0
+            self._display_id = -1
+            self.device.exit()
+            return False
+
     def swipe(
         self,
         x0: int,
@@ -503,16 +611,8 @@ class MuMu12IPC:
     ):
         if fall:
             self.touch_down(x0, y0)
-
-        # 每步耗时
-        dt = duration / steps
-
-        for i in range(1, steps + 1):
-            tx = int(x0 + (x1 - x0) * (i / steps))
-            ty = int(y0 + (y1 - y0) * (i / steps))
-            self.touch_down(tx, ty)
-            time.sleep(dt)
-
+        if not self._move([(x0, y0, x1, y1, duration)], steps):
+            return
         if lift:
             if interval:
                 time.sleep(interval)
@@ -522,25 +622,24 @@ class MuMu12IPC:
         self,
         points: list[tuple[int, int]],
         durations: list[int],
-        update: bool = False,
         interval: float = 0.0,
-        func: Callable[[np.ndarray], Any] = lambda _: None,
+        steps: int = 30,
     ):
+        """
+        一次按下、连续经过所有点后抬起，durations 为各段时长（毫秒）
+        """
         if len(points) < 2 or len(durations) != len(points) - 1:
             raise ValueError(
                 "swipe_ext requires at least 2 points and len(durations)==len(points)-1"
             )
 
-        for i, (p0, p1, d_ms) in enumerate(zip(points[:-1], points[1:], durations)):
-            self.swipe(
-                p0[0],
-                p0[1],
-                p1[0],
-                p1[1],
-                duration=max(0.01, d_ms / 1000.0),
-                fall=(i == 0),
-                lift=(i == len(durations) - 1),
-                update=(i == len(durations) - 1) and update,
-                interval=interval if i == len(durations) - 1 else 0.0,
-                func=func,
-            )
+        self.touch_down(*points[0])
+        segments = [
+            (p0[0], p0[1], p1[0], p1[1], max(0.01, d_ms / 1000.0))
+            for p0, p1, d_ms in zip(points[:-1], points[1:], durations)
+        ]
+        if not self._move(segments, steps):
+            return
+        if interval:
+            time.sleep(interval)
+        self.touch_up()
@@ -1,3 +1,4 @@
+import atexit
 import os
 import smtplib
 from email import encoders
@@ -5,8 +6,9 @@ from email.mime.base import MIMEBase
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from threading import Thread
-from time import sleep
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import monotonic, sleep
 from typing import Literal, Optional
 
 from jinja2 import Environment, FileSystemLoader, select_autoescape
@@ -27,19 +29,33 @@ recruit_rarity = env.get_template("recruit_rarity.html")
 report_template = env.get_template("report_template.html")
 version_template = env.get_template("version.html")
 
+# 待发送的邮件由一个线程依次发送，并复用 SMTP 连接；空闲超过 SMTP_IDLE_TIMEOUT 秒后关闭
+SMTP_IDLE_TIMEOUT = 60
+# 退出时最多等待未发完的邮件 MAIL_FLUSH_TIMEOUT 秒
+MAIL_FLUSH_TIMEOUT = 30
+# None 通知发送线程退出
+_mail_queue: "Queue[Optional[Email]]" = Queue()
+_mail_worker: Optional[Thread] = None
+_mail_worker_lock = Lock()
+
 
 class Email:
     def __init__(self, body, subject, attach_image, attach_files=None):
         conf = config.conf
-        msg = MIMEMultipart()
-        msg.attach(MIMEText(body, "html"))
+        if attach_image is None and not attach_files:
+            # 没有附件时不需要 multipart
+            msg = MIMEText(body, "html")
+        else:
+            msg = MIMEMultipart()
+            msg.attach(MIMEText(body, "html"))
         msg["Subject"] = subject
         msg["From"] = conf.account
         msg["To"] = ", ".join(conf.recipient)
 
         if attach_image is not None:
             attachment = img2bytes(attach_image)
-            image_content = MIMEImage(attachment.tobytes())
+            # img2bytes 固定输出 JPEG，直接指定类型，省去 MIMEImage 的格式探测
+            image_content = MIMEImage(attachment.tobytes(), "jpeg")
             image_content.add_header(
                 "Content-Disposition", "attachment", filename="image.jpg"
             )
@@ -69,7 +85,7 @@ class Email:
             self.port = 465
             self.encryption = "tls"
 
-    def send(self, recipient=None):
+    def connect(self) -> smtplib.SMTP:
         if self.encryption == "starttls":
             s = smtplib.SMTP(self.smtp_server, self.port, timeout=10)
             s.starttls()
@@ -77,11 +93,127 @@ class Email:
             s = smtplib.SMTP_SSL(self.smtp_server, self.port, timeout=10)
         conf = config.conf
         s.login(conf.account, conf.pass_code)
+        return s
+
+    def smtp_key(self):
+        """能否复用同一个 SMTP 连接的依据"""
+        conf = config.conf
+        return (
+            self.smtp_server,
+            self.port,
+            self.encryption,
+            conf.account,
+            conf.pass_code,
+        )
+
+    def send(self, recipient=None, smtp: Optional[smtplib.SMTP] = None):
+        """smtp 为空时单独建立连接，发送后关闭"""
+        conf = config.conf
         recipient = (conf.recipient or [conf.account]) if not recipient else recipient
+        if smtp is not None:
+            smtp.send_message(self.msg, conf.account, recipient)
+            return
+        s = self.connect()
         s.send_message(self.msg, conf.account, recipient)
         s.quit()
 
 
+def _quit_smtp(smtp: Optional[smtplib.SMTP]):
+    if smtp is None:
+        return
+    try:
+        smtp.quit()
+    except Exception:
+        pass
+
+
+def _smtp_alive(smtp: smtplib.SMTP) -> bool:
+    try:
+        return smtp.noop()[0] == 250
+    except Exception:
+        return False
+
+
+def _retry_send(email: Email):
+    # 第一次发送已在 _send_mail_loop 中失败，这里再试两次
+    for i in range(2):
+        sleep(2**i)
+        try:
+            email.send()
+            return
+        except Exception as e:
+            logger.exception("邮件发送失败：" + str(e))
+
+
+def _retry_send_task(email: Email):
+    try:
+        _retry_send(email)
+    finally:
+        _mail_queue.task_done()
+
+
+def _send_mail_loop():
+    global _mail_worker
+    smtp, key = None, None
+    while True:
+        try:
+            email = _mail_queue.get(timeout=SMTP_IDLE_TIMEOUT)
+        except Empty:
+            email = None
+        else:
+            if email is None:
+                _mail_queue.task_done()
+        if email is None:
+            with _mail_worker_lock:
+                if not _mail_queue.empty():
+                    continue
+                _mail_worker = None
+            _quit_smtp(smtp)
+            return
+        try:
+            # 服务器可能已关闭空闲连接，发送前确认，避免发送失败后重发同一封邮件
+            if smtp is not None and (key != email.smtp_key() or not _smtp_alive(smtp)):
+                _quit_smtp(smtp)
+                smtp = None
+            if smtp is None:
+                smtp = email.connect()
+                key = email.smtp_key()
+            email.send(smtp=smtp)
+            _mail_queue.task_done()
+        except Exception as e:
+            logger.exception("邮件发送失败：" + str(e))
+            _quit_smtp(smtp)
+            smtp = None
+            # 重试放到单独的线程，不耽误后面的邮件
+            Thread(target=_retry_send_task, args=(email,), daemon=True).start()
+
+
+@atexit.register
+def flush_mail(timeout: float = MAIL_FLUSH_TIMEOUT) -> bool:
+    """等待队列中的邮件（包括重试）发送完毕并结束发送线程
+
+    Args:
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        是否全部发送完毕
+    """
+    deadline = monotonic() + timeout
+    with _mail_worker_lock:
+        worker = _mail_worker
+        if worker is not None:
+            _mail_queue.put(None)
+    with _mail_queue.all_tasks_done:
+        while _mail_queue.unfinished_tasks:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            _mail_queue.all_tasks_done.wait(remaining)
+    if worker is not None:
+        worker.join(max(0, deadline - monotonic()))
+    return _mail_queue.unfinished_tasks == 0
+
+
 def send_message(
     body="",
     subject="",
@@ -108,13 +240,9 @@ def send_message(
     subject = conf.mail_subject + subject
     email = Email(body, subject, attach_image)
 
-    def send_message_sync(email):
-        for i in range(3):
-            try:
-                email.send()
-                break
-            except Exception as e:
-                logger.exception("邮件发送失败：" + str(e))
-                sleep(2**i)
-
-    Thread(target=send_message_sync, args=(email,)).start()
+    global _mail_worker
+    with _mail_worker_lock:
+        _mail_queue.put(email)
+        if _mail_worker is None:
+            _mail_worker = Thread(target=_send_mail_loop, daemon=True)
+            _mail_worker.start()
@@ -1,9 +1,13 @@
+import numpy as np
+
 engine = None
 
 
-def initialize_ocr(score=0.3):
+def initialize_ocr(score=0.3, intra_op_num_threads=-1):
     global engine
     if not engine:
         from rapidocr_onnxruntime import RapidOCR
 
-        engine = RapidOCR(text_score=score)
+        engine = RapidOCR(text_score=score, intra_op_num_threads=intra_op_num_threads)
+        # 预热识别模型，避免第一次读时间时才分配推理所需内存
+        engine(np.zeros((40, 160, 3), np.uint8), use_det=False, use_cls=False)
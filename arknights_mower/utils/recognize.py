@@ -11,7 +11,14 @@ from arknights_mower.utils import config
 from arknights_mower.utils import typealias as tp
 from arknights_mower.utils.csleep import MowerExit
 from arknights_mower.utils.device.device import Device
-from arknights_mower.utils.image import bytes2img, cmatch, cropimg, loadres, thres2
+from arknights_mower.utils.image import (
+    bytes2img,
+    cmatch,
+    cropimg,
+    loadres,
+    rgb2gray,
+    thres2,
+)
 from arknights_mower.utils.log import logger, save_screenshot
 from arknights_mower.utils.matcher import Matcher
 from arknights_mower.utils.scene import Scene, SceneComment
@@ -60,7 +67,7 @@ class Recognizer:
     @property
     def gray(self):
         if self._gray is None:
-            self.start()
+            self._gray = rgb2gray(self.img)
         return self._gray
 
     @property
@@ -77,9 +84,8 @@ class Recognizer:
                 if screencap is not None:
                     self._screencap = screencap
                     self._img = bytes2img(screencap)
-                    self._gray = bytes2img(screencap, True)
                 else:
-                    self._screencap, self._img, self._gray = self.device.screencap()
+                    self._screencap, self._img = self.device.screencap()
                 return
             except cv2.error as e:
                 logger.warning(e)
@@ -503,8 +503,11 @@ class Arknights数据处理器:
             # cv2.imwrite(f"/home/zhao/Desktop/data/{operator}.png", tpl)
             data[operator] = tpl
 
-        with lzma.open("arknights_mower/models/operator_room.model", "wb") as f:
-            pickle.dump(data, f)
+        np.savez_compressed(
+            "arknights_mower/models/operator_room.npz",
+            keys=np.array(list(data)),
+            templates=np.stack(list(data.values())),
+        )
 
     def 训练选中的干员名的模型(self):
         font31 = ImageFont.truetype(